@@ -1,44 +1,196 @@
+import io
 import os
+import atexit
+import queue
+import re
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import asyncio
 import random
+import itertools
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from collections import defaultdict, deque
-from dateutil import parser as date_parser
+from urllib.parse import urlparse
+from sqlalchemy import Row, bindparam, or_, select, update as sql_update
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.request import HTTPXRequest
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.date import DateTrigger
 import speech_recognition as sr
 from pydub import AudioSegment
 from dotenv import load_dotenv
-import hashlib
 
-from database import get_db, Task, create_tables
-from ai_parser import AITaskParser
+from database import PRIORITY_ORDER, SessionLocal, Task, create_tables, run_db, shutdown_db_executor
+from ai_parser import AITaskParser, parse_datetime
+from cache_utils import TTLMap
 from clarification_utils import SimpleClarificationHandler
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Configure logging. Handlers only enqueue records; a listener thread does the
+# actual stderr writes so logging never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_handler)
+logging.getLogger().addHandler(QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
+# httpx logs every request at INFO, one record per getUpdates and API call; keep warnings
+logging.getLogger("httpx").setLevel(logging.WARNING)
+_log_listener.start()
+# Flushes anything still queued on exit
+atexit.register(_log_listener.stop)
+
+# Characters that must be backslash-escaped in MarkdownV2 text
+_MARKDOWN_V2_SPECIAL = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+
+def _escape_markdown(text: str) -> str:
+    """Escape user-supplied text (task titles) for a MarkdownV2 message."""
+    return _MARKDOWN_V2_SPECIAL.sub(r'\\\1', text)
+
+
+# Statements for the hot query paths, built once at import so each call only
+# binds parameters instead of rebuilding the query.
+
+# Centralized sorting logic: dated tasks first, then by due date and priority
+_PENDING_TASKS_STMT = (
+    # Plain rows of just the listed columns; building ORM objects cost more than the query
+    select(Task.id, Task.title, Task.due_date, Task.priority, Task.status)
+    .where(Task.user_id == bindparam('user_id'), Task.status == 'pending')
+    # Task.priority is stored as its rank, so it sorts urgent first without a CASE
+    .order_by(Task.due_date.is_(None), Task.due_date, Task.priority)
 )
 
+# Reminder window scan; every selected column is in ix_tasks_reminder_due
+_UNSENT_REMINDERS_STMT = (
+    select(Task.id, Task.user_id, Task.reminder_at, Task.reminder_sent)
+    .where(
+        Task.status == 'pending',
+        Task.reminder_sent == False,
+        Task.reminder_at > bindparam('now'),
+        Task.reminder_at <= bindparam('until'),
+    )
+)
+
+# Reminders in one firing batch that are still owed: pending, not yet sent and not
+# moved to a later time since the batch was scheduled
+_DUE_REMINDERS_STMT = (
+    select(Task.id, Task.user_id, Task.title, Task.due_date)
+    .where(
+        Task.id.in_(bindparam('ids', expanding=True)),
+        Task.status == 'pending',
+        Task.reminder_at <= bindparam('now'),
+        Task.reminder_sent == False,
+    )
+)
+
+_MARK_REMINDERS_SENT_STMT = (
+    sql_update(Task)
+    .where(Task.id.in_(bindparam('ids', expanding=True)))
+    .values(reminder_sent=True)
+)
+
+_TASKS_BY_IDS_STMT = select(Task).where(
+    Task.id.in_(bindparam('ids', expanding=True)),
+    Task.user_id == bindparam('user_id')
+)
+
+# Completes a batch of tasks in one statement and hands back their titles for the reply
+_COMPLETE_TASKS_STMT = sql_update(Task).where(
+    Task.id.in_(bindparam('ids', expanding=True)),
+    # 'user_id' is reserved for the SET clause in an UPDATE, so bind the owner separately
+    Task.user_id == bindparam('owner_id')
+).values(status='completed').returning(Task.id, Task.title)
+
 class AIAssistantBot:
+    # Title keywords that mark a task as a wellness task (matched as substrings)
+    WELLNESS_KEYWORDS = ('break', 'water', 'exercise', 'walk', 'stretch', 'rest', 'breathe', 'drink', 'hydrate')
+
+    # Priority markers shown in task lists
+    PRIORITY_INDICATORS = {
+        "urgent": "🔴 *URGENT*",
+        "high": "🟠 *HIGH*",
+        "medium": "🟡",
+        "low": "🟢"
+    }
+    DEFAULT_INDICATOR = "⚪"
+
+    WELCOME_MESSAGE = (
+        "🤖 *AI Task Assistant*\n\n"
+        "I can help you manage tasks using natural language!\n\n"
+        "*Examples:*\n"
+        "• 'Add task to call mom at 3pm'\n"
+        "• 'Pay John sometime today'\n"
+        "• 'Show my tasks'\n"
+        "• 'Done 1' (mark task 1 complete)\n\n"
+        "Just tell me what you need to do!"
+    )
+
+    # Proactive wellness messages, picked at random
+    WELLNESS_SUGGESTIONS = (
+        "💧 Remember to drink some water!",
+        "🚶‍♀️ Time for a short walk to stretch your legs.",
+        "🧘 Take a moment to breathe deeply.",
+        "👀 Look away from the screen for 20 seconds to rest your eyes.",
+        "💪 A quick stretch can do wonders!",
+    )
+
+    # The only update types the handlers consume; Telegram doesn't send the rest
+    ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+    # Seconds each getUpdates call is held open when idle (Telegram allows up to 50)
+    POLL_TIMEOUT = 30
+    # Reply when the parser names tasks that don't exist (or aren't this user's)
+    TASK_NOT_FOUND_TEXT = "I couldn't find that task. Ask for your 'tasks' to see the current list."
+
     def __init__(self):
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
         
-        self.application = Application.builder().token(self.token).post_init(self.post_init).build()
+        # Bot API calls (replies, reminders, file downloads) share one HTTP/2 connection
+        # multiplexed over a single TLS session. Long polling keeps its own request so a
+        # pending getUpdates never occupies a slot in that pool. PTB's initialize() calls
+        # getMe before any update is handled, which opens the connection up front.
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .request(HTTPXRequest(connection_pool_size=32, pool_timeout=5.0, http_version='2'))
+            .get_updates_request(HTTPXRequest(http_version='2'))
+            # Handle updates concurrently so one user's parse call doesn't queue everyone
+            # else's behind it; their API calls then overlap on the shared client pool
+            .concurrent_updates(32)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
         self.ai_parser = AITaskParser()
         self.clarification_handler = SimpleClarificationHandler()
-        self.scheduler = AsyncIOScheduler()
+        # One recognizer for all voice notes. We only record() whole files and never
+        # listen(), so with a fixed threshold it holds no per-call state and is safe
+        # to share across transcription threads
+        self._recognizer = sr.Recognizer()
+        self._recognizer.energy_threshold = 300
+        self._recognizer.dynamic_energy_threshold = False
+        # Reminders are persisted in the tasks table, which stays the canonical schedule.
+        # Only those due within reminder_window are held as in-memory jobs; the
+        # reminder_window job loads the next slice every reminder_refill_interval,
+        # so the job store stays small however many reminders are queued.
+        self.reminder_window = timedelta(hours=2)
+        self.reminder_refill_interval = timedelta(hours=1)
+        # Waits before each retry of a reminder whose send failed; it stays unsent after the last
+        self.reminder_retry_delays = (timedelta(minutes=1), timedelta(minutes=5), timedelta(minutes=15))
+        self.scheduler = AsyncIOScheduler(job_defaults={
+            # Lets a delayed reminder_window refill still run; reminder jobs set their own
+            # 60s grace so a reminder is not delivered long after its time
+            'misfire_grace_time': 3600,
+            'coalesce': True,
+            'max_instances': 1,
+        })
         self.logger = logging.getLogger(__name__)
         
         # Security: Rate limiting (requests per minute per user)
@@ -50,6 +202,18 @@ class AIAssistantBot:
         self.max_message_length = 2000
         self.max_voice_duration = 120  # seconds
         
+        # Upper bound on tasks sent to the AI parser as context
+        self.max_context_tasks = 50
+        
+        # Pending time clarifications, keyed by a short hex counter and bound to the
+        # user who was asked, with an expiry and a cap on their number. The counter
+        # starts at a random offset so a keyboard sent before a restart can't match
+        # a clarification made after it.
+        self.clarification_ttl = 3600  # seconds
+        self.max_pending_clarifications = 10000
+        self.pending_clarifications = TTLMap(self.clarification_ttl, self.max_pending_clarifications)
+        self._clarification_ids = itertools.count(random.getrandbits(32))
+        
         # Security: User authorization (optional - set ALLOWED_USERS in .env)
         allowed_users_str = os.getenv('ALLOWED_USERS', '')
         self.allowed_users = set()
@@ -60,16 +224,11 @@ class AIAssistantBot:
             except ValueError:
                 self.logger.warning("Invalid ALLOWED_USERS format. Authorization disabled.")
         
-        # Wellness suggestions
-        self.wellness_suggestions = [
-            "💧 Remember to drink some water!",
-            "🚶‍♀️ Time for a short walk to stretch your legs.",
-            "🧘 Take a moment to breathe deeply.",
-            "👀 Look away from the screen for 20 seconds to rest your eyes.",
-            "💪 A quick stretch can do wonders!"
-        ]
-        
         self.user_chat_id = None  # For wellness suggestions
+        # Wellness cleanup runs every tick; a suggestion goes out every Nth tick
+        self.wellness_tick_minutes = 30
+        self.suggestion_every_ticks = 2
+        self._wellness_ticks = 0
         
         # Create database tables
         create_tables()
@@ -115,10 +274,228 @@ class AIAssistantBot:
         
         return True, ""
 
+    # Database helpers. These are synchronous and run in worker threads via
+    # run_db so SQL round trips never block the event loop. Each one
+    # owns a whole session/transaction and returns detached objects.
+
+    def _load_pending_tasks(self, user_id: int, limit: Optional[int] = None) -> List[Row]:
+        stmt = _PENDING_TASKS_STMT if limit is None else _PENDING_TASKS_STMT.limit(limit)
+        with SessionLocal() as db:
+            return db.execute(stmt, {'user_id': user_id}).all()
+
+    def _load_unsent_reminders(self, now: datetime, until: datetime) -> List[Row]:
+        with SessionLocal() as db:
+            return db.execute(_UNSENT_REMINDERS_STMT, {'now': now, 'until': until}).all()
+
+    def _load_due_reminders(self, task_ids: List[int], now: datetime) -> List[Row]:
+        with SessionLocal() as db:
+            return db.execute(_DUE_REMINDERS_STMT, {'ids': task_ids, 'now': now}).all()
+
+    def _save_tasks(self, tasks: List[Task]) -> List[Task]:
+        with SessionLocal() as db:
+            # One flush for the whole batch instead of one per task
+            db.add_all(tasks)
+            db.commit()
+
+        for task in tasks:
+            self.logger.info(f"Created task: {task.title} (ID: {task.id})")
+        return tasks
+
+    def _complete_tasks(self, user_id: int, ids: List[int]) -> Tuple[List[str], List[Row]]:
+        """Mark the given tasks complete; return their display lines and the remaining pending tasks."""
+        ids = [task_id for task_id in map(self._task_id, ids) if task_id is not None]
+        with SessionLocal() as db:
+            titles_by_id = dict(db.execute(_COMPLETE_TASKS_STMT, {'ids': ids, 'owner_id': user_id}).all())
+            completed_tasks = []
+            # Report in the order the parser listed them
+            for task_id in dict.fromkeys(ids):
+                title = titles_by_id.get(task_id)
+                if title is not None:
+                    completed_tasks.append(f"✅ {title}")
+                    self.logger.info(f"Completed task: {title}")
+
+            if completed_tasks:
+                db.commit()
+            return completed_tasks, db.execute(_PENDING_TASKS_STMT, {'user_id': user_id}).all()
+
+    def _update_tasks(self, user_id: int, updates: List[Dict]) -> Tuple[List[str], List[Row], List[Task]]:
+        """
+        Apply the parser's field updates. Returns the updated titles, the refreshed pending
+        tasks and the updated tasks whose reminder moved, which need a job for their new time.
+        """
+        updates = [(self._task_id(update_item.get('id')), update_item) for update_item in updates]
+        with SessionLocal() as db:
+            ids = [task_id for task_id, _ in updates if task_id is not None]
+            tasks_by_id = {
+                task.id: task
+                for task in db.execute(_TASKS_BY_IDS_STMT, {'ids': ids, 'user_id': user_id}).scalars()
+            }
+            updated_titles, rescheduled = [], []
+            for task_id, update_item in updates:
+                fields = update_item.get('fields_to_update') or {}
+                task = tasks_by_id.get(task_id)
+                if task:
+                    previous_reminder = task.reminder_at
+                    for field, value in fields.items():
+                        if hasattr(task, field):
+                            if field in ['due_date', 'reminder_at'] and value:
+                                parsed = self._parse_model_datetime(value)
+                                if parsed is None:
+                                    continue
+                                setattr(task, field, parsed)
+                            else:
+                                setattr(task, field, value)
+                    if task.reminder_at != previous_reminder:
+                        # A moved reminder is owed again, even if the old one was already sent
+                        task.reminder_sent = False
+                        if task.reminder_at and task.status == 'pending':
+                            rescheduled.append(task)
+                    updated_titles.append(task.title)
+                    self.logger.info(f"Updated task: {task.title}")
+
+            db.commit()
+            return updated_titles, db.execute(_PENDING_TASKS_STMT, {'user_id': user_id}).all(), rescheduled
+
+    def _mark_reminders_sent(self, task_ids: List[int]):
+        with SessionLocal() as db:
+            db.execute(_MARK_REMINDERS_SENT_STMT, {'ids': task_ids})
+            db.commit()
+
+    def _complete_expired_wellness_tasks(self, now: datetime) -> int:
+        """Auto-complete overdue wellness tasks in SQL and return how many were closed."""
+        overdue = sql_update(Task).where(Task.status == 'pending', Task.due_date < now)
+        with SessionLocal() as db:
+            # Break tasks are completed as soon as they're overdue
+            breaks = db.execute(
+                overdue.where(Task.title.ilike('%break%'))
+                .values(status='completed').returning(Task.title)
+            ).scalars().all()
+            # Other wellness tasks get a 15 min grace period and must be low priority
+            others = db.execute(
+                overdue.where(
+                    Task.due_date < now - timedelta(minutes=15),
+                    Task.priority == 'low',
+                    or_(*(Task.title.ilike(f'%{keyword}%') for keyword in self.WELLNESS_KEYWORDS if keyword != 'break'))
+                ).values(status='completed').returning(Task.title)
+            ).scalars().all()
+            db.commit()
+
+        for title in breaks:
+            self.logger.info(f"Auto-completed expired break task: {title}")
+        for title in others:
+            self.logger.info(f"Auto-completed expired wellness task: {title}")
+        return len(breaks) + len(others)
+
     async def post_init(self, application):
         """Initialize components that need the event loop to be running."""
+        # Python 3.12+: tasks run eagerly up to their first real suspension, so the many
+        # per-update coroutines that finish without waiting skip a scheduler round trip
+        if hasattr(asyncio, 'eager_task_factory'):
+            asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+        self._setup_scheduler()
         self.scheduler.start()
         self.logger.info("Scheduler started.")
+        await self._load_reminder_window()
+        # Kept on self so the task isn't garbage collected before it finishes
+        self._warm_up_task = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self):
+        """Pay one-time connection and startup costs in the background so the first message doesn't."""
+        try:
+            # Open the TLS connection to the Anthropic API ahead of the first parse
+            await self.ai_parser.anthropic_client.models.list(limit=1)
+        except Exception as e:
+            self.logger.warning(f"Anthropic warm-up failed: {e}")
+        try:
+            # Page in the ffmpeg binary pydub shells out to for voice notes
+            process = await asyncio.create_subprocess_exec(
+                AudioSegment.converter, '-version',
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            await process.wait()
+        except Exception as e:
+            self.logger.warning(f"ffmpeg warm-up failed: {e}")
+        self.logger.info("Warm-up finished.")
+
+    async def post_shutdown(self, application):
+        """Release the API connections and DB worker threads once the application has stopped."""
+        await self.ai_parser.aclose()
+        shutdown_db_executor()
+
+    def _new_task(self, user_id: int, title: str, due_date: Optional[datetime],
+                  reminder_at: Optional[datetime], priority: str = 'medium') -> Task:
+        return Task(
+            user_id=user_id,
+            title=title,
+            due_date=due_date,
+            reminder_at=reminder_at,
+            priority=priority,
+            status='pending'
+        )
+
+    def _parse_model_datetime(self, value) -> Optional[datetime]:
+        """Parse a date the parser returned, or return None (with a warning) if it isn't one."""
+        if not isinstance(value, str) or not value:
+            return None
+        try:
+            return parse_datetime(value)
+        except (ValueError, OverflowError):
+            self.logger.warning(f"Failed to parse date: {value}")
+            return None
+
+    def _task_id(self, value) -> Optional[int]:
+        """Coerce a task id the parser returned (often a string like "4"), or return None if it isn't one."""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            self.logger.warning(f"Ignoring invalid task id: {value!r}")
+            return None
+
+    def _tasks_from_creations(self, user_id: int, creations: List[Dict]) -> List[Task]:
+        """Build the tasks the parser asked for, skipping entries without a usable title."""
+        new_tasks = []
+        for creation in creations:
+            if not isinstance(creation, dict):
+                continue
+            title = creation.get('title')
+            title = title.strip() if isinstance(title, str) else ''
+            if not title:
+                continue
+
+            due_str = creation.get('due_date')
+            reminder_str = creation.get('reminder_at')
+            due_date = self._parse_model_datetime(due_str)
+            # The model usually repeats due_date as reminder_at
+            reminder_at = due_date if reminder_str == due_str else self._parse_model_datetime(reminder_str)
+            priority = creation.get('priority')
+            if priority not in PRIORITY_ORDER:
+                priority = 'medium'
+
+            new_tasks.append(self._new_task(user_id, title, due_date, reminder_at, priority))
+        return new_tasks
+
+    async def _create_tasks(self, tasks: List[Task], now: datetime) -> List[Task]:
+        """Save new tasks and schedule their reminders. Shared by every creation path."""
+        if not tasks:
+            return tasks
+        await run_db(self._save_tasks, tasks)
+        for task in tasks:
+            if task.reminder_at:
+                self._schedule_reminder(task, now)
+        return tasks
+
+    async def _load_reminder_window(self):
+        """Register reminders due within the next window. Runs on startup and then periodically."""
+        try:
+            # Past-due reminders are filtered out in SQL so a restart doesn't fire a burst of stale sends
+            now = datetime.now()
+            until = now + self.reminder_window
+            tasks = await run_db(self._load_unsent_reminders, now, until)
+            for task in tasks:
+                self._schedule_reminder(task, now)
+            self.logger.info(f"Loaded {len(tasks)} unsent reminders due before {until:%H:%M}")
+        except Exception as e:
+            self.logger.error(f"Failed to load reminders: {e}", exc_info=True)
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /start command."""
@@ -134,17 +511,7 @@ class AIAssistantBot:
         self.user_chat_id = user_id
         self.logger.info(f"User {user_id} started the bot. Storing user ID for proactive messages.")
 
-        welcome_message = (
-            "🤖 *AI Task Assistant*\n\n"
-            "I can help you manage tasks using natural language!\n\n"
-            "*Examples:*\n"
-            "• 'Add task to call mom at 3pm'\n"
-            "• 'Pay John sometime today'\n"
-            "• 'Show my tasks'\n"
-            "• 'Done 1' (mark task 1 complete)\n\n"
-            "Just tell me what you need to do!"
-        )
-        await update.message.reply_text(welcome_message, parse_mode='Markdown')
+        await update.message.reply_text(self.WELCOME_MESSAGE, parse_mode='Markdown')
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle user text messages by passing them to the processing function."""
@@ -170,11 +537,13 @@ class AIAssistantBot:
         user_id = update.effective_user.id
         self.logger.info(f"[Processing] User {user_id}: '{text_to_process}'")
 
-        thinking_message = await update.message.reply_text("🧠 Thinking...")
-        db = next(get_db())
+        # Send the placeholder while the parser's context loads; neither depends on the other
+        thinking_reply = asyncio.create_task(update.message.reply_text("🧠 Thinking..."))
         try:
-            all_user_tasks = db.query(Task).filter(Task.user_id == user_id).all()
-            result = await self.ai_parser.manage_tasks(text_to_process, all_user_tasks)
+            # Only pending tasks are numbered for the parser; use the same order as show_tasks
+            pending_tasks = await run_db(self._load_pending_tasks, user_id, self.max_context_tasks)
+            thinking_message = await thinking_reply
+            result = await self.ai_parser.manage_tasks(user_id, text_to_process, pending_tasks)
 
             # Handle conversational intents first
             if result.get('intent') in ['general_query', 'greeting']:
@@ -191,77 +560,39 @@ class AIAssistantBot:
             action_taken = False
             if result.get('completions'):
                 action_taken = True
-                completed_tasks = []
-                for completion in result['completions']:
-                    task_id = completion['id']
-                    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
-                    if task:
-                        task.status = 'completed'
-                        completed_tasks.append(f"✅ {task.title}")
-                        self.logger.info(f"Completed task: {task.title}")
+                ids = [completion.get('id') for completion in result['completions']]
+                completed_tasks, pending_tasks = await run_db(self._complete_tasks, user_id, ids)
 
                 if completed_tasks:
-                    db.commit()
-                    await self.show_tasks(update, context, completed_tasks)
+                    await self._reply_task_list(update, pending_tasks, completed_tasks)
+                    return
+                if not result.get('creations') and not result.get('updates'):
+                    await thinking_message.edit_text(self.TASK_NOT_FOUND_TEXT)
                     return
 
             if result.get('creations'):
                 action_taken = True
-                for creation in result['creations']:
-                    try:
-                        # Parse the date string into a datetime object
-                        due_date = None
-                        reminder_at = None
-                        if creation.get('due_date'):
-                            due_date = date_parser.parse(creation['due_date'])
-                        if creation.get('reminder_at'):
-                            reminder_at = date_parser.parse(creation['reminder_at'])
-
-                        new_task = Task(
-                            user_id=user_id,
-                            title=creation['title'],
-                            due_date=due_date,
-                            reminder_at=reminder_at,
-                            priority=creation.get('priority', 'medium'),
-                            status='pending'
-                        )
-                        db.add(new_task)
-                        db.flush()  # Get the ID
-                        
-                        # Schedule reminder if needed
-                        if new_task.reminder_at:
-                            self._schedule_reminder(new_task)
-                        
-                        self.logger.info(f"Created task: {new_task.title} (ID: {new_task.id})")
-                    except Exception as e:
-                        self.logger.error(f"Error creating task: {e}")
-                        continue
+                new_tasks = await self._create_tasks(
+                    self._tasks_from_creations(user_id, result['creations']), datetime.now()
+                )
 
-                db.commit()
-                await self.show_tasks(update, context)
+                if new_tasks:
+                    await self.show_tasks_summary(thinking_message, [task.title for task in new_tasks], "Created")
+                else:
+                    await self._reply_task_list(update, await run_db(self._load_pending_tasks, user_id))
                 return
 
             if result.get('updates'):
                 action_taken = True
-                for update_item in result['updates']:
-                    task_id = update_item['id']
-                    fields = update_item['fields_to_update']
-                    task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
-                    if task:
-                        for field, value in fields.items():
-                            if hasattr(task, field):
-                                if field in ['due_date', 'reminder_at'] and value:
-                                    try:
-                                        setattr(task, field, date_parser.parse(value))
-                                    except:
-                                        self.logger.error(f"Failed to parse date: {value}")
-                                        continue
-                                else:
-                                    setattr(task, field, value)
-                        self.logger.info(f"Updated task: {task.title}")
-
-                db.commit()
-                await self.show_tasks(update, context)
+                updated_titles, pending_tasks, rescheduled = await run_db(self._update_tasks, user_id, result['updates'])
+                if not updated_titles:
+                    await thinking_message.edit_text(self.TASK_NOT_FOUND_TEXT)
+                    return
+                # The job for the old time skips a moved reminder, so schedule the new one
+                now = datetime.now()
+                for task in rescheduled:
+                    self._schedule_reminder(task, now)
+                await self._reply_task_list(update, pending_tasks)
                 return
 
             # If no actions were taken, show current tasks or provide help
@@ -269,13 +600,12 @@ class AIAssistantBot:
                 if not result:
                     await thinking_message.edit_text("I'm not sure how to help. Try creating a task or asking for your 'tasks'.")
                 else:
-                    await self.show_tasks(update, context)
+                    await self._reply_task_list(update, await run_db(self._load_pending_tasks, user_id))
 
         except Exception as e:
             self.logger.error(f"Error in _process_text: {e}", exc_info=True)
+            thinking_message = await thinking_reply
             await thinking_message.edit_text("Sorry, I encountered an error processing your request.")
-        finally:
-            db.close()
 
     async def _ask_for_time_clarification(self, update: Update, original_message: str):
         """Ask for time clarification using inline buttons."""
@@ -291,38 +621,32 @@ class AIAssistantBot:
         action, object_part = self.clarification_handler.extract_task_action_and_object(original_message)
         task_preview = self.clarification_handler.create_task_title(action, object_part)
 
-        # Use a truncated hash to stay within Telegram's 64-byte callback_data limit
-        message_hash = hashlib.sha256(original_message.encode()).hexdigest()[:16]
-
-        # Create inline keyboard with time options
-        keyboard = []
-        time_slots = self.clarification_handler.TIME_SLOTS
-
-        # Create rows of 4 buttons each
-        for i in range(0, len(time_slots), 4):
-            row = []
-            for j in range(4):
-                if i + j < len(time_slots):
-                    display_time, actual_time = time_slots[i + j]
-                    callback_data = f"time_{actual_time}_{message_hash}"
-                    row.append(InlineKeyboardButton(display_time, callback_data=callback_data))
-            keyboard.append(row)
+        # A short counter key keeps callback_data within Telegram's 64-byte limit. Keys are
+        # guessable, so the entry records its owner and only that user can answer it.
+        token = format(next(self._clarification_ids), 'x')
+
+        # Create inline keyboard with time options, in rows of 4 buttons each
+        keyboard = [
+            [
+                InlineKeyboardButton(display_time, callback_data=f"time_{actual_time}_{token}")
+                for display_time, actual_time in row
+            ]
+            for row in self.clarification_handler.TIME_SLOT_ROWS
+        ]
 
         # Add custom time option
-        keyboard.append([InlineKeyboardButton("📝 Custom Time", callback_data=f"custom_{message_hash}")])
+        keyboard.append([InlineKeyboardButton("📝 Custom Time", callback_data=f"custom_{token}")])
 
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        # Store the original message in a class variable for callback access
-        if not hasattr(self, 'pending_clarifications'):
-            self.pending_clarifications = {}
-        self.pending_clarifications[message_hash] = original_message
+        # Store the original message; abandoned clarifications expire and are purged
+        self.pending_clarifications.put(token, (user_id, original_message))
 
-        question = f"What time would you like to *{task_preview.lower()}*?"
+        question = f"What time would you like to *{_escape_markdown(task_preview.lower())}*?"
         await update.message.reply_text(
             question,
             reply_markup=reply_markup,
-            parse_mode='Markdown'
+            parse_mode='MarkdownV2'
         )
 
     async def handle_time_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -343,63 +667,65 @@ class AIAssistantBot:
         user_id = update.effective_user.id
         
         if callback_data.startswith('time_'):
-            # Extract time and message hash
-            parts = callback_data.split('_')
+            # Extract time and token
+            parts = callback_data.split('_', 2)
             selected_time = parts[1]  # HH:MM format
-            message_hash = parts[2]
+            token = parts[2]
             
             # Get original message
-            original_message = self.pending_clarifications.get(message_hash)
+            now = datetime.now()
+            pending = self.pending_clarifications.get(token)
+            original_message = pending[1] if pending and pending[0] == user_id else None
             
             if not original_message:
                 await query.edit_message_text("Sorry, I lost track of your original request. Please try again.")
                 return
             
             # Create task with selected time
-            task_data = self.clarification_handler.create_task_with_time(original_message, selected_time)
+            task_data = self.clarification_handler.create_task_with_time(original_message, selected_time, now)
             
             # Save to database
-            db = next(get_db())
             try:
-                new_task = Task(
-                    user_id=user_id,
-                    title=task_data['title'],
-                    due_date=datetime.strptime(task_data['due_date'], '%Y-%m-%d %H:%M:%S'),
-                    reminder_at=datetime.strptime(task_data['reminder_at'], '%Y-%m-%d %H:%M:%S'),
-                    priority=task_data['priority'],
-                    status='pending'
+                new_task = self._new_task(
+                    user_id, task_data['title'], task_data['due_date'], task_data['reminder_at'], task_data['priority']
                 )
-                db.add(new_task)
-                db.commit()
-                
-                # Schedule reminder
-                await self._schedule_reminder(new_task)
+                await self._create_tasks([new_task], now)
                 
                 # Clean up pending clarification
-                del self.pending_clarifications[message_hash]
+                self.pending_clarifications.pop(token, None)
                 
                 # Confirm task creation
-                time_display = datetime.strptime(selected_time, '%H:%M').strftime('%I:%M %p')
-                confirmation = f"✅ Task created: *{task_data['title']}* at {time_display}"
-                await query.edit_message_text(confirmation, parse_mode='Markdown')
+                time_display = task_data['due_date'].strftime('%I:%M %p')
+                confirmation = f"✅ Task created: *{_escape_markdown(task_data['title'])}* at {time_display}"
+                await query.edit_message_text(confirmation, parse_mode='MarkdownV2')
                 
                 self.logger.info(f"[Clarification] Created task '{task_data['title']}' for user {user_id}")
                 
             except Exception as e:
                 self.logger.error(f"Error creating task from clarification: {e}")
                 await query.edit_message_text("Sorry, there was an error creating your task. Please try again.")
-            finally:
-                db.close()
         
         elif callback_data.startswith('custom_'):
             # Handle custom time input
-            message_hash = callback_data.split('_')[1]
+            token = callback_data.split('_', 1)[1]
             await query.edit_message_text(
                 "Please type your preferred time (e.g., '2:30 PM', '14:30', 'in 2 hours'):"
             )
              # Note: This would require additional conversation handling for custom times
             # For now, we'll keep it simple with predefined slots
 
+    def _transcribe(self, ogg_bytes: bytes) -> str:
+        """Decode an OGG voice note and transcribe it. Blocking; run in a worker thread."""
+        # Voice notes are a few KB, so decode and transcode them in memory instead of via temp files
+        audio = AudioSegment.from_file(io.BytesIO(ogg_bytes), format="ogg")
+        wav_buffer = io.BytesIO()
+        audio.export(wav_buffer, format="wav")
+        wav_buffer.seek(0)
+
+        with sr.AudioFile(wav_buffer) as source:
+            audio_data = self._recognizer.record(source)
+        return self._recognizer.recognize_google(audio_data)
+
     async def handle_voice_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle voice messages by transcribing them and processing the text."""
         user_id = update.effective_user.id
@@ -416,26 +742,9 @@ class AIAssistantBot:
 
         try:
             voice_file = await context.bot.get_file(update.message.voice.file_id)
-            
-            temp_dir = "temp_audio"
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-
-            # Sanitize file ID to prevent path traversal attacks
-            safe_file_id = os.path.basename(update.message.voice.file_id).replace('..', '')
-            oga_path = os.path.join(temp_dir, f"{safe_file_id}.oga")
-            wav_path = os.path.join(temp_dir, f"{safe_file_id}.wav")
-
-            await voice_file.download_to_drive(oga_path)
-
-            audio = AudioSegment.from_ogg(oga_path)
-            audio.export(wav_path, format="wav")
-
-            recognizer = sr.Recognizer()
-            with sr.AudioFile(wav_path) as source:
-                audio_data = recognizer.record(source)
-            
-            transcribed_text = recognizer.recognize_google(audio_data)
+            ogg_bytes = await voice_file.download_as_bytearray()
+            # ffmpeg decode and the Google STT request both block, so run them off the event loop
+            transcribed_text = await asyncio.to_thread(self._transcribe, ogg_bytes)
             self.logger.info(f"Transcription: '{transcribed_text}'")
 
             # Delete the 'processing' message and call the shared text processor
@@ -451,17 +760,9 @@ class AIAssistantBot:
         except Exception as e:
             self.logger.error(f"Error processing voice message: {e}", exc_info=True)
             await processing_message.edit_text("An unexpected error occurred while processing your voice note.")
-        finally:
-            # Ensure cleanup happens even if exceptions occur
-            for file_path in [oga_path, wav_path]:
-                try:
-                    if 'file_path' in locals() and os.path.exists(file_path):
-                        os.remove(file_path)
-                except Exception as cleanup_error:
-                    self.logger.warning(f"Failed to cleanup file {file_path}: {cleanup_error}")
-
-    async def show_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE, completed_tasks: List[str] = None):
-        """Show user's tasks in a formatted list. Can also show a completion message."""
+
+    async def show_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show user's tasks in a formatted list."""
         user_id = update.effective_user.id
         if not self._is_authorized(user_id):
             await update.message.reply_text("You are not authorized to use this bot.")
@@ -471,126 +772,148 @@ class AIAssistantBot:
             await update.message.reply_text("You have exceeded the rate limit. Please try again later.")
             return
         
-        db = next(get_db())
         try:
-            # Centralized sorting logic
-            pending_tasks = db.query(Task).filter(Task.user_id == user_id, Task.status == 'pending').all()
-            pending_tasks.sort(key=lambda t: (t.due_date is None, t.due_date, {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}.get(t.priority, 4)))
-
-            message = ""
-            if completed_tasks:
-                if len(completed_tasks) == 1:
-                    message += f"🎉 Great job! Completed: *{completed_tasks[0]}*\n\n"
-                else:
-                    message += f"🎉 Great job! Completed {len(completed_tasks)} tasks.\n\n"
+            pending_tasks = await run_db(self._load_pending_tasks, user_id)
+            await self._reply_task_list(update, pending_tasks)
+        except Exception as e:
+            self.logger.error(f"Error in show_tasks: {e}")
+            await update.message.reply_text("An error occurred while fetching your tasks.")
 
-            if not pending_tasks:
-                message += "🎊 **All tasks completed! You're all caught up!**" if completed_tasks else "You have no pending tasks. Add one by sending me a message!"
-                await update.message.reply_text(message, parse_mode='Markdown')
-                return
+    async def _reply_task_list(self, update: Update, pending_tasks: List[Row], completed_tasks: Optional[List[str]] = None):
+        """Reply with the given pending tasks, optionally led by a completion message."""
+        parts = []
+        if completed_tasks:
+            if len(completed_tasks) == 1:
+                parts.append(f"🎉 Great job\\! Completed: *{_escape_markdown(completed_tasks[0])}*\n\n")
+            else:
+                parts.append(f"🎉 Great job\\! Completed {len(completed_tasks)} tasks\\.\n\n")
+
+        if not pending_tasks:
+            parts.append("🎊 *All tasks completed\\! You're all caught up\\!*" if completed_tasks else "You have no pending tasks\\. Add one by sending me a message\\!")
+            await update.message.reply_text("".join(parts), parse_mode='MarkdownV2')
+            return
 
-            message += "📋 **Your Remaining Tasks:**\n\n" if completed_tasks else "📋 **Your Tasks:**\n\n"
-            for i, task in enumerate(pending_tasks, 1):
-                due_str = f" - Due: {task.due_date.strftime('%I:%M %p')}" if task.due_date else ""
-                
-                priority_indicators = {
-                    "urgent": "🔴 **URGENT**",
-                    "high": "🟠 **HIGH**", 
-                    "medium": "🟡",
-                    "low": "🟢"
-                }
-                priority_display = priority_indicators.get(task.priority, "⚪")
-                
-                message += f"{i}. {priority_display} {task.title}{due_str}\n"
+        parts.append("📋 *Your Remaining Tasks:*\n\n" if completed_tasks else "📋 *Your Tasks:*\n\n")
+        for i, task in enumerate(pending_tasks, 1):
+            due_str = f" \\- Due: {task.due_date.strftime('%I:%M %p')}" if task.due_date else ""
+            priority_display = self.PRIORITY_INDICATORS.get(task.priority, self.DEFAULT_INDICATOR)
+            parts.append(f"{i}\\. {priority_display} {_escape_markdown(task.title)}{due_str}\n")
 
-            message += f"\n_Total: {len(pending_tasks)} pending tasks_"
-            message += f"\n\n💡 *Tip: Say 'done 1' to complete task #1*"
-            await update.message.reply_text(message, parse_mode='Markdown')
+        parts.append(f"\n_Total: {len(pending_tasks)} pending tasks_")
+        parts.append("\n\n💡 *Tip: Say 'done 1' to complete task \\#1*")
+        await update.message.reply_text("".join(parts), parse_mode='MarkdownV2')
 
-        except Exception as e:
-            self.logger.error(f"Error in show_tasks: {e}")
-            await update.message.reply_text("An error occurred while fetching your tasks.")
-        finally:
-            db.close()
-
-    async def _schedule_reminder(self, task: Task):
-        if task.reminder_at and task.reminder_at > datetime.now() and not task.reminder_sent:
-            trigger = DateTrigger(run_date=task.reminder_at)
-            job_id = f"task_reminder_{task.id}"
-            self.scheduler.add_job(
-                self.send_reminder,
-                trigger=trigger,
-                args=[task.user_id, task.id],
-                id=job_id,
-                replace_existing=True
-            )
+    async def show_tasks_summary(self, message, titles: List[str], action: str):
+        """Confirm a change by editing `message` in place, without re-sending the whole task list."""
+        if len(titles) == 1:
+            parts = [f"✅ {action}: *{_escape_markdown(titles[0])}*"]
+        else:
+            parts = [f"✅ {action} {len(titles)} tasks:"]
+            parts.extend(f"\n• {_escape_markdown(title)}" for title in titles)
+        parts.append("\n\n💡 *Tip: Say 'show my tasks' to see your full list*")
+        await message.edit_text("".join(parts), parse_mode='MarkdownV2')
+
+    def _schedule_reminder(self, task: Task, now: Optional[datetime] = None):
+        """Schedule the task's reminder. Callers handling a batch pass one shared `now`."""
+        now = now or datetime.now()
+        if task.reminder_at and task.reminder_at > now + self.reminder_window:
+            self.logger.info(f"Reminder for task {task.id} at {task.reminder_at} is outside the window; it will be loaded later.")
+        elif task.reminder_at and task.reminder_at > now and not task.reminder_sent:
+            # Reminders due at the same moment share one job, so they are checked with one
+            # query, sent together and marked sent with one UPDATE
+            # Keyed on the full timestamp: every task in a job must be due at the job's run_date
+            job_id = f"reminders_{task.reminder_at.isoformat()}"
+            job = self.scheduler.get_job(job_id)
+            if job is None:
+                self.scheduler.add_job(
+                    self.send_reminders,
+                    trigger=DateTrigger(run_date=task.reminder_at),
+                    args=[[task.id]],
+                    id=job_id,
+                    misfire_grace_time=60,
+                    coalesce=True
+                )
+            elif task.id not in job.args[0]:
+                job.modify(args=[job.args[0] + [task.id]])
             self.logger.info(f"Successfully scheduled reminder for task {task.id} (Job ID: {job_id}) at {task.reminder_at}")
         else:
             self.logger.info(f"Did not schedule reminder for task {task.id}. Reason: No reminder time, reminder in past, or already sent.")
 
-    async def send_reminder(self, user_id: int, task_id: int):
-        db = next(get_db())
+    async def send_reminders(self, task_ids: List[int], attempt: int = 0):
+        """Send every reminder in a batch that is still owed, then mark the delivered ones sent."""
         try:
-            task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
-            if task and task.status == 'pending':
-                reminder_message = f"🔔 **Reminder: Time to start your task!**\n\n" \
-                                   f"**Task:** {task.title}"
-                if task.due_date:
-                    reminder_message += f"\n**Due:** {task.due_date.strftime('%a, %b %d, %I:%M %p')}"
-
-                await self.application.bot.send_message(chat_id=user_id, text=reminder_message, parse_mode='Markdown')
-                task.reminder_sent = True
-                db.commit()
-                self.logger.info(f"Successfully sent reminder for task {task_id} to user {user_id}")
-            elif task:
-                self.logger.warning(f"Skipped sending reminder for task {task_id} as its status is '{task.status}'.")
+            tasks = await run_db(self._load_due_reminders, task_ids, datetime.now())
+            skipped = len(task_ids) - len(tasks)
+            if skipped:
+                self.logger.warning(f"Skipped {skipped} reminder(s) whose task is no longer pending, was already reminded or was rescheduled.")
+            if not tasks:
+                return
+            results = await asyncio.gather(*(self._send_reminder(task) for task in tasks), return_exceptions=True)
+            sent_ids, failed_ids = [], []
+            for task, result in zip(tasks, results):
+                if isinstance(result, Exception):
+                    failed_ids.append(task.id)
+                    self.logger.error(f"Failed to send reminder for task {task.id}: {result}")
+                else:
+                    sent_ids.append(task.id)
+                    self.logger.info(f"Successfully sent reminder for task {task.id} to user {task.user_id}")
+            if sent_ids:
+                await run_db(self._mark_reminders_sent, sent_ids)
+            if failed_ids:
+                self._retry_reminders(failed_ids, attempt)
         except Exception as e:
-            self.logger.error(f"Failed to send reminder for task {task_id}: {e}", exc_info=True)
-        finally:
-            db.close()
+            self.logger.error(f"Failed to send reminders for tasks {task_ids}: {e}", exc_info=True)
+
+    def _retry_reminders(self, task_ids: List[int], attempt: int):
+        """Schedule another send for reminders that failed; they stay unsent if retries run out."""
+        if attempt >= len(self.reminder_retry_delays):
+            self.logger.error(f"Giving up on reminders for tasks {task_ids} after {attempt + 1} attempts.")
+            return
+        run_date = datetime.now() + self.reminder_retry_delays[attempt]
+        self.scheduler.add_job(
+            self.send_reminders,
+            trigger=DateTrigger(run_date=run_date),
+            args=[task_ids, attempt + 1],
+            misfire_grace_time=60,
+            coalesce=True
+        )
+        self.logger.info(f"Retrying reminders for tasks {task_ids} at {run_date:%H:%M:%S}")
+
+    async def _send_reminder(self, task: Row):
+        parts = ["🔔 *Reminder: Time to start your task\\!*\n\n", f"*Task:* {_escape_markdown(task.title)}"]
+        if task.due_date:
+            parts.append(f"\n*Due:* {task.due_date.strftime('%a, %b %d, %I:%M %p')}")
+        await self.application.bot.send_message(chat_id=task.user_id, text="".join(parts), parse_mode='MarkdownV2')
+
+    def _purge_expired_clarifications(self):
+        """Drop pending clarifications that were never answered."""
+        purged = self.pending_clarifications.purge_expired()
+        if purged:
+            self.logger.info(f"Purged {purged} expired clarifications")
 
     async def cleanup_expired_wellness_tasks(self):
         """Auto-complete expired wellness tasks (breaks, water, exercise, etc.)."""
-        db = next(get_db())
         try:
             now = datetime.now()
-            wellness_keywords = ['break', 'water', 'exercise', 'walk', 'stretch', 'rest', 'breathe', 'drink', 'hydrate']
-            
-            # Find expired wellness tasks - be more aggressive with break tasks
-            expired_wellness_tasks = db.query(Task).filter(
-                Task.status == 'pending',
-                Task.due_date < now  # Any overdue task
-            ).all()
-            
-            completed_count = 0
-            # Filter by wellness keywords in title
-            for task in expired_wellness_tasks:
-                if any(keyword in task.title.lower() for keyword in wellness_keywords):
-                    # For break tasks, auto-complete immediately when overdue
-                    if 'break' in task.title.lower():
-                        task.status = 'completed'
-                        completed_count += 1
-                        self.logger.info(f"Auto-completed expired break task: {task.title}")
-                    # For other wellness tasks, give 15 min grace period and check priority
-                    elif task.due_date < now - timedelta(minutes=15) and task.priority == 'low':
-                        task.status = 'completed'
-                        completed_count += 1
-                        self.logger.info(f"Auto-completed expired wellness task: {task.title}")
-            
+            self._purge_expired_clarifications()
+            completed_count = await run_db(self._complete_expired_wellness_tasks, now)
             if completed_count > 0:
-                db.commit()
                 self.logger.info(f"Auto-completed {completed_count} expired wellness tasks")
-            
         except Exception as e:
             self.logger.error(f"Error in wellness task cleanup: {e}")
-        finally:
-            db.close()
+
+    async def _wellness_tick(self):
+        """Single periodic wellness job: clean up expired tasks, and send a suggestion every few ticks."""
+        await self.cleanup_expired_wellness_tasks()
+        self._wellness_ticks += 1
+        if self._wellness_ticks % self.suggestion_every_ticks == 0:
+            await self.send_proactive_wellness_suggestion()
 
     async def send_proactive_wellness_suggestion(self):
         """Periodically send a random wellness suggestion to the user."""
         if self.user_chat_id:
             try:
-                suggestion = random.choice(self.wellness_suggestions)
+                suggestion = random.choice(self.WELLNESS_SUGGESTIONS)
                 await self.application.bot.send_message(chat_id=self.user_chat_id, text=suggestion)
                 self.logger.info(f"Sent proactive wellness suggestion to user {self.user_chat_id}: {suggestion}")
             except Exception as e:
@@ -607,23 +930,39 @@ class AIAssistantBot:
 
     def _setup_scheduler(self):
         self.scheduler.add_job(
-            self.cleanup_expired_wellness_tasks,
+            self._load_reminder_window,
             'interval',
-            minutes=30,
-            id='wellness_cleanup'
+            seconds=self.reminder_refill_interval.total_seconds(),
+            id='reminder_window'
         )
 
+        # A late tick is skipped rather than run in a burst after a pause; the next one catches up
         self.scheduler.add_job(
-            self.send_proactive_wellness_suggestion,
+            self._wellness_tick,
             'interval',
-            hours=1,
-            id='proactive_wellness'
+            minutes=self.wellness_tick_minutes,
+            id='wellness',
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=60
         )
 
     def run(self):
-        """Set up and run the bot."""
+        """Set up and run the bot. Uses a webhook when WEBHOOK_URL is set, long polling otherwise."""
         self.logger.info("🤖 AI Assistant Bot is starting...")
-        self.application.run_polling()
+        webhook_url = os.getenv('WEBHOOK_URL')
+        if webhook_url:
+            self.logger.info(f"Running in webhook mode at {webhook_url}")
+            self.application.run_webhook(
+                listen='0.0.0.0',
+                port=int(os.getenv('PORT', 8443)),
+                url_path=urlparse(webhook_url).path.lstrip('/'),
+                webhook_url=webhook_url,
+                secret_token=os.getenv('WEBHOOK_SECRET'),
+                allowed_updates=self.ALLOWED_UPDATES,
+            )
+        else:
+            self.application.run_polling(timeout=self.POLL_TIMEOUT, allowed_updates=self.ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,17 @@
-from anthropic import AsyncAnthropic
-import json
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+import httpx
+import hashlib
+import orjson
+import functools
 import re
+import string
 import logging
 from datetime import datetime, timedelta
 from dateutil import parser as date_parser
-from typing import List, Dict, Optional
-from database import Task
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import Row, delete
+from database import ResponseCacheEntry, SessionLocal, Task, run_db
+from cache_utils import TTLMap
 import os
 from dotenv import load_dotenv
 
@@ -16,90 +22,319 @@ if os.path.exists(dotenv_path):
 
 logger = logging.getLogger(__name__)
 
+# One client, and so one connection pool, for every parser in the process. Keep-alive
+# connections are reused across calls so requests skip TCP and TLS setup, and HTTP/2
+# lets concurrent parses share a connection.
+_ANTHROPIC_CLIENT = AsyncAnthropic(
+    api_key=os.getenv('ANTHROPIC_API_KEY'),
+    # The SDK's client subclass keeps its redirect and transport defaults
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        timeout=30,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60),
+    ),
+    max_retries=2,
+)
+
+# Static part of the manage_tasks system prompt. It must not depend on the time, the
+# user's tasks or their message, so the API can cache it as a prefix across calls;
+# those values are sent in a second, uncached system block.
+_TASK_INSTRUCTIONS = """
+You are a friendly, intelligent, and time-aware AI assistant for managing a to-do list. Your primary goal is to understand the user's request, correct any errors, and respond with a single, valid JSON object that represents the necessary actions.
+
+**CRITICAL CONTEXT**:
+- The **Current Time**, the user's current tasks and the task ID mapping are given in the context block after these instructions. All relative times (e.g., "in 5 minutes", "tonight", "in 30 seconds") MUST be calculated based on that exact current time. Do not guess.
+
+**Core Capabilities**:
+1.  **Smart Correction**: The user's message may be a raw transcription from a voice note and contain phonetic or spelling errors. You must intelligently correct these mistakes before processing the command.
+2.  **Time-Aware Task Management**: You can create, complete, update, and list tasks. All dates and times must be calculated relative to the current time provided in the context block.
+3.  **Conversational Handling**: You can handle simple greetings and general questions.
+
+**JSON Response Structure**:
+Respond with a JSON object containing one or more of the following fields:
+- `creations`: A list of new tasks to be created. Each task must have a `title`, `due_date` (in '%Y-%m-%d %H:%M:%S' format), `reminder_at` (same as due_date), and `priority`.
+- `completions`: A list of tasks to be marked as complete. Each must have the `id` of the task.
+- `updates`: A list of tasks to be updated. Each must have the `id` of the task and a `fields_to_update` dictionary.
+- `general_query`: For questions like "help" or "what can you do?". Respond with a well-formatted, user-friendly guide using Telegram's `Markdown` format. CRITICAL: Use single asterisks for bold (e.g., *bold text*), not double asterisks.
+- `greeting`: For simple greetings like "hey", "hello", "hi". Provide a friendly `response`.
+
+**Examples** (these assume the current time is 2025-01-15 10:00:00 and the mapping contains "Display #2 = Task ID 17"; always use the real values from the context block):
+- User: "remind me to call mom at 3pm tomorrow"
+  JSON: {"creations": [{"title": "Call mom", "due_date": "2025-01-16 15:00:00", "reminder_at": "2025-01-16 15:00:00", "priority": "medium"}]}
+- User: "remind me to take a break in 30 seconds"
+  JSON: {"creations": [{"title": "Take a break", "due_date": "2025-01-15 10:00:30", "reminder_at": "2025-01-15 10:00:30", "priority": "medium"}]}
+- User: "Go play jirutsu at 8pm" -> (You correct this to "Go play jujutsu at 8pm")
+  JSON: {"creations": [{"title": "Go play jujutsu", "due_date": "2025-01-15 20:00:00", "reminder_at": "2025-01-15 20:00:00", "priority": "medium"}]}
+- User: "done 2"
+  JSON: {"completions": [{"id": 17}]}
+- User: "all tasks are done for today" or "mark all tasks complete" or "everything is done"
+  JSON: {"completions": [{"id": <Task ID>}, ...]} with one entry for every Task ID in the mapping
+- User: "what can you do?"
+  JSON: {"intent": "general_query", "response": "I'm your AI assistant for managing your to-do list! Here's what I can help you with:\n\n*Task Management:*\n- Create new tasks with reminders (e.g., 'remind me to call mom at 3pm tomorrow')\n- Mark tasks as complete (e.g., 'done 2' to complete task #2)\n- Update existing tasks\n- Show your current task list\n\n*Smart Features:*\n- I understand relative time (like 'in 5 minutes', 'tonight', 'tomorrow')\n- I can correct spelling and voice transcription errors\n\n*How to Use:*\n- Just tell me what you want to do naturally\n- Say 'show my tasks' to see everything\n- Use 'done [number]' to complete tasks"}
+- User: "hey"
+  JSON: {"intent": "greeting", "response": "Hello! How can I help you today?"}
+
+If the user's request is unclear or doesn't fit any of the above actions, return an empty JSON object: {}.
+"""
+
+# Per-call context block of the manage_tasks prompt. Only these fields are substituted on
+# each request; the surrounding text is parsed once at import.
+_CONTEXT_TEMPLATE = string.Template("""
+**Current Time**: `${current_time}`
+
+**User's Current Tasks**:
+${numbered_tasks}
+
+**Task ID Mapping (for updates/completions)**:
+${task_mapping}
+""")
+
+
+
+class _JSONObjectScanner:
+    """Track brace depth over streamed text to spot where the first top-level JSON object ends."""
+
+    def __init__(self):
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume the next chunk of text; return True once the object has closed."""
+        for ch in chunk:
+            pos = self._pos
+            self._pos += 1
+            if self.end is not None:
+                continue
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '{':
+                if self._depth == 0:
+                    self.start = pos
+                self._depth += 1
+            elif self._depth == 0:
+                continue  # Prose or a code fence before the object
+            elif ch == '"':
+                self._in_str = True
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = self._pos
+        return self.end is not None
+
+
+def _extract_json(text: str) -> Optional[str]:
+    """Return the first balanced top-level JSON object in `text`, preferring a ```json fence."""
+    _, fence, fenced = text.partition("```json")
+    if fence:
+        text = fenced
+    scanner = _JSONObjectScanner()
+    if scanner.feed(text):
+        return text[scanner.start:scanner.end]
+    return None
+
+# The model usually repeats due_date as reminder_at, and datetimes are immutable, so results are shared
+@functools.lru_cache(maxsize=4096)
+def parse_datetime(value: str) -> datetime:
+    """Parse a date string from the model, falling back to dateutil for non-ISO input."""
+    # The prompt asks for ISO format, which the C fromisoformat parses far faster than dateutil
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = date_parser.parse(value)
+    # Stored and scheduled times are naive local time (the prompt gives the model local
+    # "now"), so convert any offset the model added rather than comparing aware to naive
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+# Result fields that don't depend on the current time, so a cached answer stays correct.
+# Creations and updates carry model-computed dates and are never cached.
+_CACHEABLE_FIELDS = frozenset({'completions', 'intent', 'response'})
+
+
 class AITaskParser:
+    # Messages the bot can answer without a model call. Matched against normalized text
+    FAST_DONE_RE = re.compile(r'(?:done|completed?|finished?|mark\s+done)\s+#?(\d+)')
+    # Bulk completion only on an explicit "tasks", "everything" or "mark all"; a bare
+    # "all done" is as likely to be a sign-off as a request to clear the list
+    FAST_ALL_DONE_RE = re.compile(
+        r'(?:(?:all (?:(?:my|the) )?tasks|everything) (?:is |are )?(?:done|completed?|finished)(?: for today)?'
+        r'|mark (?:all|everything)(?: tasks)? (?:as )?(?:done|complete[d]?))'
+    )
+    FAST_GREETING_RE = re.compile(r'(?:hi|hey|hello|yo|sup)(?:\s+there)?')
+    GREETING_RESPONSE = "Hello! How can I help you today?"
+    # generate_smart_response answers these chit-chat messages without a model call
+    CANNED_REPLIES = (
+        (FAST_GREETING_RE, "Ready for instructions."),
+        (re.compile(r'(?:thanks|thank you|thx|ty)(?: (?:so|very) much)?'), "Acknowledged."),
+    )
+
     def __init__(self):
-        self.anthropic_client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        self.anthropic_client = _ANTHROPIC_CLIENT
+        # Recent manage_tasks results, keyed by user, normalized text and the displayed
+        # (id, title) pairs, so "done 2" is only reused for the same user and the same list.
+        # Misses fall back to the response_cache table, which survives restarts and is
+        # shared between processes.
+        self.cache_ttl = 300  # seconds
+        self.max_cache_entries = 1000
+        self._response_cache = TTLMap(self.cache_ttl, self.max_cache_entries)
+
+    async def aclose(self):
+        """Close the shared API client's connections. Call once, at shutdown."""
+        await self.anthropic_client.close()
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.lower().split()).rstrip(".!? ")
+
+    def _fast_path(self, normalized: str, task_ids: List[int]) -> Optional[Dict]:
+        """Resolve "done N", "mark all done" and bare greetings locally; return None to defer to the model."""
+        match = self.FAST_DONE_RE.fullmatch(normalized)
+        if match:
+            display_number = int(match.group(1))
+            if 1 <= display_number <= len(task_ids):
+                return {"completions": [{"id": task_ids[display_number - 1]}]}
+            return None
+        if task_ids and self.FAST_ALL_DONE_RE.fullmatch(normalized):
+            return {"completions": [{"id": task_id} for task_id in task_ids]}
+        if self.FAST_GREETING_RE.fullmatch(normalized):
+            return {"intent": "greeting", "response": self.GREETING_RESPONSE}
+        return None
+
+    def _cache_put(self, key: Tuple, result: Dict, ttl: Optional[float] = None, persist: bool = True):
+        if not result or not _CACHEABLE_FIELDS.issuperset(result):
+            return
+        # Entries restored from the table carry their remaining TTL
+        self._response_cache.put(key, result, ttl)
+        if persist:
+            # Fire and forget: the reply shouldn't wait on the write
+            run_db(self._persist_result, key, result)
+
+    @staticmethod
+    def _cache_key_hash(key: Tuple) -> str:
+        return hashlib.sha256(orjson.dumps(key)).hexdigest()
+
+    def _load_persisted_result(self, key: Tuple) -> Optional[Tuple[Dict, float]]:
+        """Look up a result another process (or an earlier run) cached; returns it with its remaining TTL."""
+        try:
+            with SessionLocal() as db:
+                entry = db.get(ResponseCacheEntry, self._cache_key_hash(key))
+                if entry is None:
+                    return None
+                remaining = (entry.expires_at - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    return None
+                return orjson.loads(entry.result), remaining
+        except Exception as e:
+            logger.warning(f"Could not read the persisted response cache: {e}")
+            return None
 
-    async def manage_tasks(self, text: str, user_context: List[Task] = []) -> Dict:
+    def _persist_result(self, key: Tuple, result: Dict):
+        """Write a cached result through to the shared table and drop expired rows."""
+        now = datetime.now()
+        try:
+            with SessionLocal() as db:
+                db.merge(ResponseCacheEntry(
+                    key_hash=self._cache_key_hash(key),
+                    result=orjson.dumps(result).decode(),
+                    expires_at=now + timedelta(seconds=self.cache_ttl),
+                ))
+                db.execute(delete(ResponseCacheEntry).where(ResponseCacheEntry.expires_at <= now))
+                db.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist a response cache entry: {e}")
+
+    def _build_system_prompt(self, now: datetime, numbered_tasks_str: str, task_mapping_str: str) -> List[Dict]:
+        """Return the manage_tasks system blocks: the cached instructions, then the per-call context."""
+        # Only the context block changes between calls; the instructions before it are served from the prompt cache
+        context_prompt = _CONTEXT_TEMPLATE.safe_substitute(
+            current_time=now.isoformat(sep=' ', timespec='seconds'),
+            numbered_tasks=numbered_tasks_str,
+            task_mapping=task_mapping_str,
+        )
+        return [
+            {"type": "text", "text": _TASK_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": context_prompt},
+        ]
+
+    async def manage_tasks(self, user_id: int, text: str, user_context: List[Row] = []) -> Dict:
         """
         Parse natural language to create, complete, delete, or query tasks, and ask for clarification when needed.
+        `user_context` must already be in display order (the database sorts it), so the numbering matches the task list.
         """
-        # Filter only pending tasks and sort them
-        pending_tasks = [task for task in user_context if task.status == 'pending']
-        pending_tasks.sort(key=lambda t: (t.due_date is None, t.due_date, {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}.get(t.priority, 4)))
-        
-        # Create numbered list with clear mapping
-        numbered_tasks_str = "\n".join([f'{i}. {task.title} (Task ID: {task.id})' for i, task in enumerate(pending_tasks, 1)]) or "No pending tasks."
+        # One pass filters pending tasks and builds the ids, cache key, display list and id mapping together
+        task_ids, task_key, numbered_lines, mapping_lines = [], [], [], []
+        for task in user_context:
+            if task.status != 'pending':
+                continue
+            task_ids.append(task.id)
+            task_key.append((task.id, task.title))
+            i = len(task_ids)
+            numbered_lines.append(f'{i}. {task.title} (Task ID: {task.id})')
+            mapping_lines.append(f"Display #{i} = Task ID {task.id}")
+
+        normalized = self._normalize(text)
+        fast_result = self._fast_path(normalized, task_ids)
+        if fast_result is not None:
+            logger.debug(f"Fast path handled '{normalized}'")
+            return fast_result
+
+        cache_key = (user_id, normalized, tuple(task_key))
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Response cache hit for '{normalized}'")
+            return cached
+        persisted = await run_db(self._load_persisted_result, cache_key)
+        if persisted is not None:
+            logger.debug(f"Persisted response cache hit for '{normalized}'")
+            cached, remaining = persisted
+            self._cache_put(cache_key, cached, ttl=remaining, persist=False)
+            return cached
         
-        # Create mapping for AI to understand
-        task_mapping = {str(i): task.id for i, task in enumerate(pending_tasks, 1)}
-        task_mapping_str = "\n".join([f"Display #{i} = Task ID {task.id}" for i, task in enumerate(pending_tasks, 1)]) or "No task mappings."
+        numbered_tasks_str = "\n".join(numbered_lines) or "No pending tasks."
+        task_mapping_str = "\n".join(mapping_lines) or "No task mappings."
         
-        now = datetime.now()
-        current_time_str = now.strftime('%Y-%m-%d %H:%M:%S')
-        tomorrow = (now + timedelta(days=1)).strftime('%Y-%m-%d')
-
-        system_prompt = f"""
-        You are a friendly, intelligent, and time-aware AI assistant for managing a to-do list. Your primary goal is to understand the user's request, correct any errors, and respond with a single, valid JSON object that represents the necessary actions.
-
-        **CRITICAL CONTEXT**:
-        - **Current Time**: `{current_time_str}`. All relative times (e.g., "in 5 minutes", "tonight", "in 30 seconds") MUST be calculated based on this exact time. Do not guess.
-
-        **Core Capabilities**:
-        1.  **Smart Correction**: The user's message may be a raw transcription from a voice note and contain phonetic or spelling errors. You must intelligently correct these mistakes before processing the command.
-        2.  **Time-Aware Task Management**: You can create, complete, update, and list tasks. All dates and times must be calculated relative to the current time provided above.
-        3.  **Conversational Handling**: You can handle simple greetings and general questions.
-
-        **User's Current Tasks**:
-        {numbered_tasks_str}
-
-        **Task ID Mapping (for updates/completions)**:
-        {task_mapping_str}
-
-        **JSON Response Structure**:
-        Respond with a JSON object containing one or more of the following fields:
-        - `creations`: A list of new tasks to be created. Each task must have a `title`, `due_date` (in '%Y-%m-%d %H:%M:%S' format), `reminder_at` (same as due_date), and `priority`.
-        - `completions`: A list of tasks to be marked as complete. Each must have the `id` of the task.
-        - `updates`: A list of tasks to be updated. Each must have the `id` of the task and a `fields_to_update` dictionary.
-        - `general_query`: For questions like "help" or "what can you do?". Respond with a well-formatted, user-friendly guide using Telegram's `Markdown` format. CRITICAL: Use single asterisks for bold (e.g., *bold text*), not double asterisks.
-        - `greeting`: For simple greetings like "hey", "hello", "hi". Provide a friendly `response`.
-
-        **Examples**:
-        - User: "remind me to call mom at 3pm tomorrow"
-          JSON: {{"creations": [{{"title": "Call mom", "due_date": "{tomorrow} 15:00:00", "reminder_at": "{tomorrow} 15:00:00", "priority": "medium"}}]}}
-        - User: "remind me to take a break in 30 seconds" (Current time is {current_time_str})
-          JSON: {{"creations": [{{"title": "Take a break", "due_date": "{(now + timedelta(seconds=30)).strftime('%Y-%m-%d %H:%M:%S')}", "reminder_at": "{(now + timedelta(seconds=30)).strftime('%Y-%m-%d %H:%M:%S')}", "priority": "medium"}}]}}
-        - User: "Go play jirutsu at 8pm" -> (You correct this to "Go play jujutsu at 8pm")
-          JSON: {{"creations": [{{"title": "Go play jujutsu", "due_date": "{now.strftime('%Y-%m-%d')} 20:00:00", "reminder_at": "{now.strftime('%Y-%m-%d')} 20:00:00", "priority": "medium"}}]}}
-        - User: "done 2"
-          JSON: {{"completions": [{{"id": {task_mapping.get('2')}}}]}}
-        - User: "all tasks are done for today" or "mark all tasks complete" or "everything is done"
-          JSON: {{"completions": [{{"id": task_id}} for task_id in [{', '.join([str(task.id) for task in user_context if task.status == 'pending'])}]]}}
-        - User: "what can you do?"
-          JSON: {{"intent": "general_query", "response": "I'm your AI assistant for managing your to-do list! Here's what I can help you with:\n\n*Task Management:*\n- Create new tasks with reminders (e.g., 'remind me to call mom at 3pm tomorrow')\n- Mark tasks as complete (e.g., 'done 2' to complete task #2)\n- Update existing tasks\n- Show your current task list\n\n*Smart Features:*\n- I understand relative time (like 'in 5 minutes', 'tonight', 'tomorrow')\n- I can correct spelling and voice transcription errors\n\n*How to Use:*\n- Just tell me what you want to do naturally\n- Say 'show my tasks' to see everything\n- Use 'done [number]' to complete tasks"}}
-        - User: "hey"
-          JSON: {{"intent": "greeting", "response": "Hello! How can I help you today?"}}
-
-        If the user's request is unclear or doesn't fit any of the above actions, return an empty JSON object: {{}}.
-        """
-        message = await self.anthropic_client.messages.create(
+        # Stream the reply and stop reading as soon as the JSON object closes, so any
+        # trailing commentary from the model is neither waited for nor generated
+        scanner = _JSONObjectScanner()
+        chunks = []
+        async with self.anthropic_client.messages.stream(
             model="claude-sonnet-4-20250514",
             max_tokens=2000,
             temperature=0.1,
-            system=system_prompt,
+            system=self._build_system_prompt(datetime.now(), numbered_tasks_str, task_mapping_str),
             messages=[
                 {"role": "user", "content": text}
             ]
+        ) as stream:
+            async for delta in stream.text_stream:
+                chunks.append(delta)
+                if scanner.feed(delta):
+                    break
+            # Input usage arrives with the first event, so it is known even after stopping early
+            usage = stream.current_message_snapshot.usage
+        logger.debug(
+            f"Prompt cache: read {getattr(usage, 'cache_read_input_tokens', 0)} tokens, "
+            f"wrote {getattr(usage, 'cache_creation_input_tokens', 0)} tokens"
         )
-        content = message.content[0].text.strip()
+        content = "".join(chunks).strip()
         logger.debug(f"Raw AI response for task management:\n{content}")
         
         try:
             # Find the JSON block, whether it's in a markdown code block or not
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                parsed_json = json.loads(json_str)
+            json_str = _extract_json(content)
+            if json_str:
+                parsed_json = orjson.loads(json_str)
+                self._cache_put(cache_key, parsed_json)
                 
                 # Directly return the parsed JSON. The bot logic can handle the structure.
                 return parsed_json
@@ -107,57 +342,13 @@ class AITaskParser:
                 logger.warning(f"No JSON object found in AI response: {content}")
                 return {}
 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.error(f"Failed to decode JSON from AI response: {content}")
             return {}
         except Exception as e:
             logger.error(f"An unexpected error occurred during task parsing: {e}")
             return {}
     
-    def _validate_and_process_tasks(self, tasks_data: List[Dict]) -> List[Dict]:
-        """
-        Validate and process the extracted tasks
-        """
-        processed_tasks = []
-        
-        for task in tasks_data:
-            try:
-                processed_task = {
-                    'title': task.get('title', '').strip(),
-                    'description': task.get('description', '').strip(),
-                    'due_date': None,
-                    'priority': task.get('priority', 'medium').lower(),
-                    'estimated_duration': task.get('estimated_duration'),
-                    'reminder_at': None
-                }
-
-                due_date_str = task.get('due_date')
-                if due_date_str:
-                    try:
-                        processed_task['due_date'] = date_parser.parse(due_date_str)
-                    except ValueError:
-                        logger.warning(f"Could not parse due_date: {due_date_str}")
-
-                reminder_at_str = task.get('reminder_at')
-                if reminder_at_str:
-                    try:
-                        processed_task['reminder_at'] = date_parser.parse(reminder_at_str)
-                    except ValueError:
-                        logger.warning(f"Could not parse reminder_at: {reminder_at_str}")
-                
-                if processed_task['priority'] not in ['low', 'medium', 'high', 'urgent']:
-                    processed_task['priority'] = 'medium'
-                
-                if processed_task['title']:  # Only add if title exists
-                    processed_tasks.append(processed_task)
-                    
-            except Exception as e:
-                logger.error(f"Error processing task: {e}")
-                continue
-        
-        return processed_tasks
-    
-        
     async def generate_smart_response(self, user_message: str, actions: Dict, all_tasks: List[Task]) -> str:
         """
         Generate an intelligent, context-aware response based on the actions taken.
@@ -166,6 +357,7 @@ class AITaskParser:
 
         if has_actions:
             # --- Task-Oriented Response ---
+            # The confirmation only restates counts we already have, so no model call is needed
             summary_lines = []
             if actions.get("creations"):
                 summary_lines.append(f"Added {len(actions['creations'])} new task(s).")
@@ -173,38 +365,19 @@ class AITaskParser:
                 summary_lines.append(f"Marked {len(actions['completions'])} task(s) as complete.")
             if actions.get("deletions"):
                 summary_lines.append(f"Removed {len(actions['deletions'])} task(s).")
-            action_summary = " ".join(summary_lines)
-
-            pending_tasks_count = len([task for task in all_tasks if task.status == 'pending'])
-            
-            system_prompt = f"""
-            You are a professional AI assistant. Your purpose is to confirm actions clearly and concisely.
-
-            Your Persona: Direct, efficient, and professional. No cheerleading, no emojis.
-
-            Context: The user has just managed their tasks. Confirm the action taken.
 
-            - User's message: "{user_message}"
-            - Actions taken: {action_summary}
-            - Pending tasks: {pending_tasks_count}
+            pending_tasks_count = sum(1 for task in all_tasks if task.status == 'pending')
+            if pending_tasks_count:
+                summary_lines.append(f"{pending_tasks_count} pending.")
+            return " ".join(summary_lines)
 
-            Guidelines:
-            - State the outcome directly (e.g., "Task list updated.", "Task created.").
-            - Keep the response to a single, short sentence.
-            - Do not add conversational filler.
-
-            Example Responses:
-            - "Done."
-            - "Acknowledged. Task created."
-            - "Task list updated. 2 tasks completed."
-
-            Now, craft a professional response confirming the action.
-            """
-            user_prompt = "Provide a professional summary of the changes."
+        # --- Conversational Response ---
+        normalized = self._normalize(user_message)
+        for pattern, reply in self.CANNED_REPLIES:
+            if pattern.fullmatch(normalized):
+                return reply
 
-        else:
-            # --- Conversational Response ---
-            system_prompt = f"""
+        persona_prompt = """
             You are a professional AI assistant. The user has sent a message that is not a task. Respond directly and professionally.
 
             Your Persona:
@@ -223,17 +396,17 @@ class AITaskParser:
 
             Now, provide a direct, professional response.
             """
-            user_prompt = user_message
 
         message = await self.anthropic_client.messages.create(
             model="claude-sonnet-4-20250514",
             max_tokens=100,
             temperature=0.2,
-            system=system_prompt,
+            # The persona text is fixed, so it is marked as a cacheable prefix
+            system=[{"type": "text", "text": persona_prompt, "cache_control": {"type": "ephemeral"}}],
             messages=[
                 {
                     "role": "user",
-                    "content": user_prompt
+                    "content": user_message
                 }
             ]
         )
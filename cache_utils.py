@@ -0,0 +1,56 @@
+"""
+Small in-memory caches shared by the bot and the AI parser.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class TTLMap:
+    """
+    A size-capped mapping whose entries expire `ttl` seconds after they are stored.
+
+    Entries are kept in insertion order, so with a common TTL the oldest expire first and
+    purging stops at the first live entry. An entry may be stored with a shorter TTL than
+    those after it, so lookups also check the entry's own expiry.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, monotonic expiry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return default
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store `value`, replacing any entry for `key`, and evict the oldest entries over the cap."""
+        self.purge_expired()
+        self._entries.pop(key, None)
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from the oldest end and return how many were dropped."""
+        now = time.monotonic()
+        purged = 0
+        while self._entries:
+            key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+            purged += 1
+        return purged
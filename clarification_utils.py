@@ -5,20 +5,38 @@ import re
 from typing import Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
+def _chunk(items: list, size: int) -> list:
+    """Split a list into consecutive rows of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
 class SimpleClarificationHandler:
     
-    # Patterns that indicate vague timing
-    VAGUE_TIME_PATTERNS = [
-        r'\bsometime today\b',
-        r'\blater today\b', 
-        r'\blater\b',
-        r'\bsoon\b',
-        r'\bin a bit\b',
-        r'\bin a while\b',
-        r'\bthis afternoon\b',
-        r'\bthis evening\b',
-        r'\btoday\b(?!\s+at|\s+\d)',  # "today" without specific time
-    ]
+    # Vague timing phrases as one trie-factored pattern: shared prefixes ("later" /
+    # "later today", "in a bit" / "in a while", "this ...") are matched once, so the
+    # engine tries a handful of branches per position instead of one per phrase.
+    # "today" only counts when no specific time follows it.
+    VAGUE_TIME_RE = re.compile(
+        r'\b(?:sometime today|later(?: today)?|soon|in a (?:bit|while)|this (?:afternoon|evening))\b'
+        r'|\btoday\b(?!\s+at|\s+\d)'
+    )
+
+    # Patterns that indicate a specific time has been mentioned
+    SPECIFIC_TIME_RE = re.compile("|".join(f"(?:{pattern})" for pattern in (
+        r'\d{1,2}:\d{2}\s*(am|pm)?',  # e.g., 5:30, 5:30pm, 17:30
+        r'\b\d{1,2}\s*(pm|am)\b',      # e.g., 5pm, 5 am
+        r'(at|for|by)\s+\d{1,2}(\s*pm|\s*am)?\b',  # e.g., at 5, for 5pm, by 3
+    )))
+
+    # Common action patterns: (regex, title prefix, group holding the object)
+    ACTION_PATTERNS = [(re.compile(pattern), prefix, group) for pattern, prefix, group in (
+        (r'^(pay|send money to|transfer to)\s+(.+)', 'Pay', 2),
+        (r'^(call|phone|ring)\s+(.+)', 'Call', 2),
+        (r'^(email|send email to|write to)\s+(.+)', 'Email', 2),
+        (r'^(meet|meeting with)\s+(.+)', 'Meet with', 2),
+        (r'^(buy|purchase|get)\s+(.+)', 'Buy', 2),
+        (r'^(remind me to|reminder to)\s+(.+)', 'Reminder', 2),
+        (r'^(finish|complete|do)\s+(.+)', 'Finish', 2),
+    )]
     
     # Common time slots for buttons
     TIME_SLOTS = [
@@ -36,45 +54,29 @@ class SimpleClarificationHandler:
         ("8:00 PM", "20:00"),
     ]
     
+    # TIME_SLOTS laid out as keyboard rows of 4 buttons
+    TIME_SLOT_ROWS = _chunk(TIME_SLOTS, 4)
+    
     def needs_clarification(self, text: str) -> bool:
         """Check if text contains vague time references that need clarification."""
         text_lower = text.lower()
 
-        # Patterns that indicate a specific time has been mentioned.
-        # If found, no clarification is needed, and the AI parser should handle it.
-        specific_time_patterns = [
-            r'\d{1,2}:\d{2}\s*(am|pm)?',  # e.g., 5:30, 5:30pm, 17:30
-            r'\b\d{1,2}\s*(pm|am)\b',      # e.g., 5pm, 5 am
-            r'(at|for|by)\s+\d{1,2}(\s*pm|\s*am)?\b' # e.g., at 5, for 5pm, by 3
-        ]
-
-        if any(re.search(pattern, text_lower) for pattern in specific_time_patterns):
+        # If a specific time is mentioned, no clarification is needed, and the AI parser should handle it.
+        if self.SPECIFIC_TIME_RE.search(text_lower):
             return False
 
         # If no specific time is found, then check for vague terms.
-        return any(re.search(pattern, text_lower) for pattern in self.VAGUE_TIME_PATTERNS)
+        return self.VAGUE_TIME_RE.search(text_lower) is not None
     
     def extract_task_action_and_object(self, text: str) -> Tuple[str, str]:
         """Extract the action and object from task text using simple patterns."""
         text_clean = text.lower().strip()
         
         # Remove vague time phrases to get core task
-        for pattern in self.VAGUE_TIME_PATTERNS:
-            text_clean = re.sub(pattern, '', text_clean).strip()
-        
-        # Common action patterns
-        action_patterns = [
-            (r'^(pay|send money to|transfer to)\s+(.+)', 'Pay', 2),
-            (r'^(call|phone|ring)\s+(.+)', 'Call', 2),
-            (r'^(email|send email to|write to)\s+(.+)', 'Email', 2),
-            (r'^(meet|meeting with)\s+(.+)', 'Meet with', 2),
-            (r'^(buy|purchase|get)\s+(.+)', 'Buy', 2),
-            (r'^(remind me to|reminder to)\s+(.+)', 'Reminder', 2),
-            (r'^(finish|complete|do)\s+(.+)', 'Finish', 2),
-        ]
+        text_clean = self.VAGUE_TIME_RE.sub('', text_clean).strip()
         
-        for pattern, action_prefix, group_num in action_patterns:
-            match = re.search(pattern, text_clean)
+        for pattern, action_prefix, group_num in self.ACTION_PATTERNS:
+            match = pattern.search(text_clean)
             if match:
                 object_part = match.group(group_num).strip()
                 return action_prefix, object_part
@@ -106,14 +108,14 @@ class SimpleClarificationHandler:
         else:
             return f"{action} {object_clean}"
     
-    def create_task_with_time(self, original_text: str, selected_time: str) -> Dict:
-        """Create a complete task object with the selected time."""
+    def create_task_with_time(self, original_text: str, selected_time: str, now: Optional[datetime] = None) -> Dict:
+        """Create a complete task object with the selected time (due_date/reminder_at are datetimes)."""
         action, object_part = self.extract_task_action_and_object(original_text)
         title = self.create_task_title(action, object_part)
         
-        # Parse selected time (format: "HH:MM")
-        today = datetime.now().strftime('%Y-%m-%d')
-        due_date = f"{today} {selected_time}:00"
+        # Selected time is "HH:MM" for today
+        hour, minute = map(int, selected_time.split(':'))
+        due_date = (now or datetime.now()).replace(hour=hour, minute=minute, second=0, microsecond=0)
         
         # Determine priority based on action
         priority = "medium"
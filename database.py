@@ -1,11 +1,81 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Float
+from sqlalchemy import create_engine, event, insert, inspect, select, text, Column, Integer, JSON, SmallInteger, String, DateTime, Text, Boolean, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import TypeDecorator
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import orjson
 import os
+import threading
+from dotenv import load_dotenv
+
+from cache_utils import TTLMap
+
+# Explicitly load .env file from the project root
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
 
 Base = declarative_base()
 
+class utc_now(FunctionElement):
+    """The current UTC time as a naive DATETIME, rendered for each database's dialect."""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utc_now)
+def _utc_now_default(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utc_now, 'postgresql')
+def _utc_now_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utc_now, 'mysql')
+@compiles(utc_now, 'mariadb')
+def _utc_now_mysql(element, compiler, **kw):
+    return "UTC_TIMESTAMP()"
+
+@compiles(utc_now, 'mssql')
+def _utc_now_mssql(element, compiler, **kw):
+    return "GETUTCDATE()"
+
+class CodedString(TypeDecorator):
+    """
+    A string from a small fixed set, stored as its index in `values` (a SMALLINT).
+    Code keeps reading and writing the names; unknown names are stored as `default`.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, values: tuple, default: str):
+        super().__init__()
+        self.values = values
+        self.default = default
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return self.values.index(value)
+        except ValueError:
+            return self.values.index(self.default)
+
+    def process_result_value(self, value, dialect):
+        # SQLite columns created as VARCHAR before the switch hand codes back as text
+        return None if value is None else self.values[int(value)]
+
+# Task priorities, most urgent first. The stored code doubles as the sort rank
+PRIORITIES = ('urgent', 'high', 'medium', 'low')
+PRIORITY_ORDER = {name: rank for rank, name in enumerate(PRIORITIES)}
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
+MESSAGE_TYPES = ('text', 'voice', 'command')
+
 class Task(Base):
     __tablename__ = 'tasks'
     
@@ -14,17 +84,37 @@ class Task(Base):
     title = Column(String(500), nullable=False)
     description = Column(Text)
     due_date = Column(DateTime)
-    priority = Column(String(20), default='medium')  # low, medium, high, urgent
-    status = Column(String(20), default='pending')  # pending, in_progress, completed
+    priority = Column(CodedString(PRIORITIES, 'medium'), default='medium')
+    status = Column(CodedString(TASK_STATUSES, 'pending'), default='pending')
     estimated_duration = Column(Float)  # in hours
     reminder_at = Column(DateTime, nullable=True)  # Time for the reminder
     reminder_sent = Column(Boolean, default=False)  # To track if the reminder was sent
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # The database stamps these in UTC in each INSERT/UPDATE. Not a server_default,
+    # so older tables need no DDL change.
+    created_at = Column(DateTime, default=utc_now())
+    updated_at = Column(DateTime, default=utc_now(), onupdate=utc_now())
+    
+    __table_args__ = (
+        # Serves the per-user pending task listing and its due date ordering
+        Index('ix_tasks_user_status_due', 'user_id', 'status', 'due_date'),
+        # Serves the reminder window scan: equality columns first, then the reminder_at
+        # range, with user_id included so the scan never has to visit the table rows
+        Index('ix_tasks_reminder_due', 'reminder_sent', 'status', 'reminder_at', 'user_id'),
+        # Serves the cross-user overdue scan in wellness cleanup, which has no user_id to lead with
+        Index('ix_tasks_status_due', 'status', 'due_date'),
+    )
     
     def __repr__(self):
         return f"<Task(id={self.id}, title='{self.title}', priority='{self.priority}')>"
 
+class ResponseCacheEntry(Base):
+    """A cached parser result, shared by every bot process and kept across restarts."""
+    __tablename__ = 'response_cache'
+
+    key_hash = Column(String(64), primary_key=True)  # sha256 of the user ID, normalized text and displayed (id, title) pairs
+    result = Column(Text, nullable=False)  # JSON
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 class Conversation(Base):
     __tablename__ = 'conversations'
     
@@ -32,8 +122,13 @@ class Conversation(Base):
     user_id = Column(Integer, nullable=False)
     message = Column(Text, nullable=False)
     response = Column(Text)
-    message_type = Column(String(20), default='text')  # text, voice, command
-    created_at = Column(DateTime, default=datetime.utcnow)
+    message_type = Column(CodedString(MESSAGE_TYPES, 'text'), default='text')
+    created_at = Column(DateTime, default=utc_now())
+
+    __table_args__ = (
+        # Serves per-user chat history in time order
+        Index('ix_conversations_user_created', 'user_id', 'created_at'),
+    )
     
     def __repr__(self):
         return f"<Conversation(id={self.id}, user_id={self.user_id})>"
@@ -45,26 +140,187 @@ class UserProfile(Base):
     user_id = Column(Integer, unique=True, nullable=False)
     username = Column(String(100))
     timezone = Column(String(50), default='UTC')
-    preferences = Column(Text)  # JSON string for user preferences
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    preferences = Column(JSON)  # Stored as JSON text on SQLite, so existing rows read as before
+    created_at = Column(DateTime, default=utc_now())
+    updated_at = Column(DateTime, default=utc_now(), onupdate=utc_now())
     
     def __repr__(self):
         return f"<UserProfile(user_id={self.user_id}, username='{self.username}')>"
 
 # Database setup
-DATABASE_URL = "sqlite:///ai_assistant.db"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = os.getenv('DATABASE_URL', "sqlite:///ai_assistant.db")
+# One engine and pool shared by every handler; pre-ping drops connections the
+# server has closed and recycle retires them before managed DB idle timeouts
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+# Upper bound on connections the engine hands out at once
+DB_MAX_CONNECTIONS = DB_POOL_SIZE + DB_MAX_OVERFLOW
+# JSON columns are encoded and decoded with orjson rather than the stdlib json module
+_JSON_CODEC = {
+    'json_serializer': lambda value: orjson.dumps(value).decode(),
+    'json_deserializer': orjson.loads,
+}
+_url = make_url(DATABASE_URL)
+if _url.get_backend_name() == 'sqlite' and _url.database in (None, '', ':memory:'):
+    # An in-memory database lives only as long as its connection, so every session
+    # must share the one connection instead of each pooled connection getting its own
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+        **_JSON_CODEC,
+    )
+    # The shared connection must not be used from two threads at once
+    DB_MAX_CONNECTIONS = 1
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        **_JSON_CODEC,
+    )
+
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        """Tune each new SQLite connection once, as the pool opens it."""
+        cursor = dbapi_conn.cursor()
+        # WAL lets task listings read while a handler or reminder job writes, and with
+        # synchronous=NORMAL a commit appends to the log instead of fsyncing the database
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.close()
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Dedicated threads for the sync DB helpers, sized to the connection pool so queries
+# never queue behind other blocking work on the default executor and every worker can
+# get a connection without waiting. Coroutines await DB work through run_db, so the
+# event loop keeps serving other updates while a query runs.
+_db_executor = ThreadPoolExecutor(max_workers=DB_MAX_CONNECTIONS, thread_name_prefix='db')
+
+def run_db(func, *args) -> asyncio.Future:
+    """Run a sync function that opens its own SessionLocal() on the DB executor; await the result."""
+    return asyncio.get_running_loop().run_in_executor(_db_executor, func, *args)
+
+def shutdown_db_executor():
+    """Wait for in-flight DB work to finish and stop the DB threads. Call once, at shutdown."""
+    _db_executor.shutdown(wait=True)
+
+def bulk_log_conversations(rows: list):
+    """
+    Insert many Conversation rows (dicts of column values) in one statement.
+    Skips the ORM unit of work; SQLAlchemy batches the rows into multi-row INSERTs.
+    """
+    if not rows:
+        return
+    with SessionLocal() as db:
+        db.execute(insert(Conversation), rows)
+        db.commit()
+
+# Profiles cached per user so per-message lookups skip the SELECT. Entries expire, so a
+# write from another process is seen within the TTL. Every local write bumps the
+# generation, and a read that started before it doesn't store the row it loaded.
+_profile_cache = TTLMap(ttl=300, max_entries=10_000)
+_profile_lock = threading.Lock()
+_profile_generation = 0
+_NOT_CACHED = object()
+
+def get_user_profile(user_id: int):
+    """Return the user's profile as an immutable row, or None if they have none."""
+    with _profile_lock:
+        cached = _profile_cache.get(user_id, _NOT_CACHED)
+        generation = _profile_generation
+    if cached is not _NOT_CACHED:
+        return cached
+    with SessionLocal() as db:
+        profile = db.execute(
+            select(UserProfile.user_id, UserProfile.username, UserProfile.timezone, UserProfile.preferences)
+            .where(UserProfile.user_id == user_id)
+        ).first()
+    with _profile_lock:
+        if generation == _profile_generation:
+            _profile_cache.put(user_id, profile)
+    return profile
+
+def save_user_profile(user_id: int, **fields):
+    """Create or update a user's profile and drop its cached copy so the next read sees it."""
+    with SessionLocal() as db:
+        profile = db.execute(select(UserProfile).where(UserProfile.user_id == user_id)).scalar_one_or_none()
+        if profile is None:
+            profile = UserProfile(user_id=user_id)
+            db.add(profile)
+        for field, value in fields.items():
+            setattr(profile, field, value)
+        db.commit()
+    global _profile_generation
+    with _profile_lock:
+        _profile_generation += 1
+        _profile_cache.pop(user_id)
+
+# Indexes from earlier schema versions, superseded by the ones declared above
+_RETIRED_INDEXES = ('ix_tasks_reminder_at',)
+
+def _migrate_coded_columns(conn):
+    """Convert CodedString columns still holding names (the old VARCHAR schema) to their codes."""
+    existing = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not existing.has_table(table.name):
+            continue
+        for column in table.columns:
+            if not isinstance(column.type, CodedString):
+                continue
+            coded = column.type
+            whens = " ".join(f"WHEN '{name}' THEN {code}" for code, name in enumerate(coded.values))
+            to_code = f"CASE {column.name} {whens} ELSE {coded.values.index(coded.default)} END"
+            if conn.dialect.name == 'sqlite':
+                # SQLite can't change a column's type; codes stored in the old column read back fine
+                conn.execute(text(
+                    f"UPDATE {table.name} SET {column.name} = {to_code} "
+                    f"WHERE typeof({column.name}) = 'text' AND {column.name} NOT GLOB '[0-9]*'"
+                ))
+            else:
+                current = next(c for c in existing.get_columns(table.name) if c['name'] == column.name)
+                if isinstance(current['type'], Integer):
+                    continue
+                if conn.dialect.name != 'postgresql':
+                    raise RuntimeError(
+                        f"{table.name}.{column.name} still stores names; converting it to codes is only "
+                        f"supported on SQLite and PostgreSQL, not {conn.dialect.name}"
+                    )
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE SMALLINT USING {to_code}"
+                ))
+
+def _drop_retired_indexes(conn):
+    """Drop indexes a newer index has replaced, so writes stop maintaining them."""
+    existing = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not existing.has_table(table.name):
+            continue
+        for index in existing.get_indexes(table.name):
+            if index['name'] not in _RETIRED_INDEXES:
+                continue
+            # MySQL-family databases and SQL Server name the table in DROP INDEX
+            if conn.dialect.name in ('mysql', 'mariadb', 'mssql'):
+                conn.execute(text(f"DROP INDEX {index['name']} ON {table.name}"))
+            else:
+                conn.execute(text(f"DROP INDEX {index['name']}"))
 
 def create_tables():
     """Create all database tables"""
     Base.metadata.create_all(bind=engine)
-
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    with engine.begin() as conn:
+        _migrate_coded_columns(conn)
+    # create_all skips tables that already exist, so add any indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # and drop ones a newer index has replaced
+    with engine.begin() as conn:
+        _drop_retired_indexes(conn)
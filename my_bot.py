@@ -1,9 +1,9 @@
+import asyncio
 import logging
 from telegram import Update
+from telegram.constants import MessageLimit
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-
-# Enable logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+from telegram.request import HTTPXRequest
 
 import os
 from dotenv import load_dotenv
@@ -15,28 +15,61 @@ if os.path.exists(dotenv_path):
 
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN_MY_BOT')
 
+logger = logging.getLogger(__name__)
+
+START_TEXT = 'Hi! I am your dasi. Send me any message and I will tell you what you said like a loser!'
+ECHO_PREFIX = 'You said: '
+# Longest echoed text that still fits in one Telegram message after the prefix
+MAX_ECHO_LENGTH = MessageLimit.MAX_TEXT_LENGTH - len(ECHO_PREFIX)
+# Plain text messages, built once for every handler that needs it
+TEXT_NOT_COMMAND = filters.TEXT & ~filters.COMMAND
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
-    await update.message.reply_text('Hi! I am your dasi. Send me any message and I will tell you what you said like a loser!')
+    await update.message.reply_text(START_TEXT)
 
 async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Echo the user message."""
     user_message = update.message.text
-    await update.message.reply_text(f'You said: {user_message}')
+    if not user_message or user_message.isspace():
+        return
+    await update.message.reply_text(ECHO_PREFIX + user_message[:MAX_ECHO_LENGTH])
+
+async def post_init(application: Application):
+    """Run handler tasks eagerly on Python 3.12+; echo usually finishes without suspending."""
+    if hasattr(asyncio, 'eager_task_factory'):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
 
 def main():
     """Start the bot."""
-    # Create the Application
-    application = Application.builder().token(TOKEN).build()
+    # Configure logging here rather than at import. httpx logs every request at INFO,
+    # which for a polling bot is one record per getUpdates, so it only reports warnings
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("telegram").setLevel(logging.WARNING)
+
+    if not TOKEN:
+        raise ValueError("TELEGRAM_BOT_TOKEN_MY_BOT environment variable is required")
+
+    # Create the Application. Replies and long polling each reuse one HTTP/2 connection
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .request(HTTPXRequest(http_version='2'))
+        .get_updates_request(HTTPXRequest(http_version='2'))
+        .post_init(post_init)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, echo))
+    # echo keeps no state, so PTB can run it without holding up the next update
+    application.add_handler(MessageHandler(TEXT_NOT_COMMAND, echo, block=False))
 
     # Run the bot
-    print("Bot is starting...")
-    application.run_polling()
+    logger.info("Bot is starting...")
+    # Hold each idle getUpdates open for 30s instead of 10s, and only ask for messages
+    application.run_polling(timeout=30, allowed_updates=[Update.MESSAGE])
 
 if __name__ == '__main__':
-    main()
     main()
\ No newline at end of file